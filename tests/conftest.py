@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 from pubtools.pulplib import FakeController
 
 from ubi_manifest.app.factory import create_app
+from ubi_manifest.worker import ubi_config
 
 
 @pytest.fixture
@@ -14,6 +15,14 @@ def client():
     yield TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def clear_ubi_config_loaders():
+    # loaders are shared within the process, don't leak configs between tests
+    ubi_config._LOADERS.clear()
+    yield
+    ubi_config._LOADERS.clear()
+
+
 @pytest.fixture(name="pulp")
 def fake_pulp():
     yield FakeController()
@@ -1,8 +1,22 @@
-from pubtools.pulplib import Distributor, ModulemdUnit, RpmDependency, RpmUnit
+from unittest import mock
+
+from pubtools.pulplib import (
+    Criteria,
+    Distributor,
+    ModulemdUnit,
+    RpmDependency,
+    RpmUnit,
+)
 from testfixtures import LogCapture
 
 from ubi_manifest.worker.common import get_pkgs_from_all_modules
-from ubi_manifest.worker.models import DepsolverItem, PackageToExclude, UbiUnit
+from ubi_manifest.worker.models import (
+    DepsolverItem,
+    NameIndex,
+    PackageToExclude,
+    UbiUnit,
+)
+from ubi_manifest.worker.pulp_queries import search_rpms
 from ubi_manifest.worker.tasks.depsolver import Depsolver
 
 from .utils import create_and_insert_repo, rpmdeps_from_names
@@ -11,7 +25,7 @@ from .utils import create_and_insert_repo, rpmdeps_from_names
 def test_resolve_rpms(pulp):
     """tests querying for provides in pulp"""
     depsolver = Depsolver(None, None, None, None)
-    depsolver._unsolved_rpms = {RpmDependency(name="gcc")}
+    depsolver._unsolved_rpms = NameIndex([RpmDependency(name="gcc")])
 
     repo = create_and_insert_repo(id="test_repo_id", pulp=pulp)
     unit_1 = RpmUnit(
@@ -32,7 +46,10 @@ def test_resolve_rpms(pulp):
     )
     pulp.insert_units(repo, [unit_1, unit_2])
 
-    result = depsolver.resolve_rpms([repo], [])
+    fts = depsolver.resolve_rpms([repo], [])
+    # all unsolved requires fit into one batch
+    assert len(fts) == 1
+    result = fts[0].result()
     # there is only one unit in the result with the highest version
     assert len(result) == 1
     unit = result[0]
@@ -43,7 +60,7 @@ def test_resolve_rpms(pulp):
 def test_resolve_files(pulp):
     """tests querying for files in pulp"""
     depsolver = Depsolver(None, None, None, None)
-    depsolver._unsolved_files = {RpmDependency(name="/some/script")}
+    depsolver._unsolved_files = NameIndex([RpmDependency(name="/some/script")])
 
     repo = create_and_insert_repo(id="test_repo_id", pulp=pulp)
     unit_1 = RpmUnit(
@@ -66,7 +83,10 @@ def test_resolve_files(pulp):
     )
     pulp.insert_units(repo, [unit_1, unit_2])
 
-    result = depsolver.resolve_files([repo], [])
+    fts = depsolver.resolve_files([repo], [])
+    # all unsolved requires fit into one batch
+    assert len(fts) == 1
+    result = fts[0].result()
     # there is only one unit in the result with the highest version
     assert len(result) == 1
     unit = result[0]
@@ -79,10 +99,10 @@ def test_extract_and_resolve():
     depsolver = Depsolver(None, None, None, None)
 
     # set initial data to depsolver instance
-    depsolver._required_rpms = rpmdeps_from_names("pkg_a", "pkg_b")
-    depsolver._provided_rpms = rpmdeps_from_names("pkg_c", "pkg_d")
-    depsolver._unsolved_rpms = rpmdeps_from_names("pkg_a", "pkg_b")
-    depsolver._required_files = {"/some/file"}
+    depsolver._required_rpms = NameIndex(rpmdeps_from_names("pkg_a", "pkg_b"))
+    depsolver._provided_rpms = NameIndex(rpmdeps_from_names("pkg_c", "pkg_d"))
+    depsolver._unsolved_rpms = NameIndex(rpmdeps_from_names("pkg_a", "pkg_b"))
+    depsolver._required_files = NameIndex(rpmdeps_from_names("/some/file"))
 
     unit = RpmUnit(
         name="test",
@@ -98,19 +118,45 @@ def test_extract_and_resolve():
     depsolver.extract_and_resolve([unit])
     # internal state of depsolver should change
     # pkg_f, pkg_g and pkg_h are new requirements that are added to the requires set
-    assert depsolver._required_rpms == rpmdeps_from_names(
+    assert set(depsolver._required_rpms) == rpmdeps_from_names(
         "pkg_a", "pkg_b", "pkg_f", "pkg_g", "pkg_h"
     )
     # pkg_e and pkg_b are added to the provides set
-    assert depsolver._provided_rpms == rpmdeps_from_names(
+    assert set(depsolver._provided_rpms) == rpmdeps_from_names(
         "pkg_c", "pkg_d", "pkg_e", "pkg_b"
     )
     # pkg_b is resolved but pkg_f, pkg_g and pkg_h are added as new unsolved requirement
-    assert depsolver._unsolved_rpms == rpmdeps_from_names(
+    assert set(depsolver._unsolved_rpms) == rpmdeps_from_names(
         "pkg_a", "pkg_f", "pkg_g", "pkg_h"
     )
     # the file requirement should have been cleared, 'test' unit resolves it
-    assert depsolver._unsolved_files == set()
+    assert len(depsolver._unsolved_files) == 0
+
+
+def test_extract_and_resolve_skips_processed_rpms():
+    """test that already processed RPMs are not extracted again"""
+    depsolver = Depsolver(None, None, None, None)
+
+    unit = RpmUnit(
+        name="test",
+        version="10",
+        release="200",
+        epoch="1",
+        arch="x86_64",
+        filename="test-10-200.x86_64.rpm",
+        requires=[RpmDependency(name="pkg_a")],
+    )
+
+    depsolver.extract_and_resolve([unit])
+    assert set(depsolver._unsolved_rpms) == rpmdeps_from_names("pkg_a")
+
+    # simulate the resolver taking the unsolvable require
+    depsolver._unsolved_rpms.pop_batch(1)
+
+    # the same RPM pulled again doesn't bring its requires back to unsolved
+    depsolver.extract_and_resolve([unit])
+    assert len(depsolver._unsolved_rpms) == 0
+    assert set(depsolver._required_rpms) == rpmdeps_from_names("pkg_a")
 
 
 def test_get_base_packages(pulp):
@@ -151,7 +197,8 @@ def test_get_base_packages(pulp):
         PackageToExclude("test", globbing=False, arch="s390x"),
     ]
 
-    result = depsolver.get_base_packages([repo], pkgs_to_search, blacklist)
+    item = DepsolverItem(set(pkgs_to_search), blacklist, [repo])
+    result = depsolver.get_base_packages([item])
     # there should be only one package in result with the highest version
     assert len(result) == 1
     unit = result[0]
@@ -159,6 +206,129 @@ def test_get_base_packages(pulp):
     assert unit.version == "100"
 
 
+def test_get_base_packages_with_modular_pkgs(pulp):
+    """test that modular rpms are queried alongside input packages"""
+    modular_filename = "test-1-1.module+el8.x86_64.rpm"
+    depsolver = Depsolver(None, None, None, {modular_filename})
+
+    repo = create_and_insert_repo(id="test_repo_id", pulp=pulp)
+
+    unit_1 = RpmUnit(
+        name="test",
+        version="100",
+        release="200",
+        epoch="1",
+        arch="x86_64",
+        filename="test-100-200.x86_64.rpm",
+    )
+    unit_2 = RpmUnit(
+        name="test",
+        version="1",
+        release="1.module+el8",
+        epoch="1",
+        arch="x86_64",
+        filename=modular_filename,
+    )
+    unit_3 = RpmUnit(
+        name="other",
+        version="1",
+        release="1",
+        epoch="1",
+        arch="x86_64",
+        filename="other-1-1.x86_64.rpm",
+    )
+
+    pulp.insert_units(repo, [unit_1, unit_2, unit_3])
+
+    item = DepsolverItem({"test"}, [], [repo])
+    result = depsolver.get_base_packages([item], {modular_filename})
+    # latest non-modular package by name and the requested modular package
+    assert sorted(unit.filename for unit in result) == [
+        "test-1-1.module+el8.x86_64.rpm",
+        "test-100-200.x86_64.rpm",
+    ]
+
+
+def test_get_base_packages_modular_pkgs_query_size(pulp):
+    """test that modular rpms are searched in batches of specific search"""
+    modular_filenames = {f"test-{i}-1.module+el8.x86_64.rpm" for i in range(5)}
+    depsolver = Depsolver(None, None, None, set(modular_filenames))
+
+    repo = create_and_insert_repo(id="test_repo_id", pulp=pulp)
+    pulp.insert_units(
+        repo,
+        [
+            RpmUnit(
+                name="test",
+                version=str(i),
+                release="1.module+el8",
+                epoch="1",
+                arch="x86_64",
+                filename=f"test-{i}-1.module+el8.x86_64.rpm",
+            )
+            for i in range(5)
+        ],
+    )
+
+    item = DepsolverItem({"test"}, [], [repo])
+    with mock.patch(
+        "ubi_manifest.worker.tasks.depsolver.rpm_depsolver.BATCH_SIZE_RPM_SPECIFIC", 2
+    ), mock.patch(
+        "ubi_manifest.worker.pulp_queries.Criteria.or_", wraps=Criteria.or_
+    ) as or_criteria:
+        result = depsolver.get_base_packages([item], modular_filenames)
+
+    # one query for the name, five filenames are split into queries of at most two
+    assert sorted(len(call.args) for call in or_criteria.call_args_list) == [1, 1, 2, 2]
+    # rpms found by name are all modular, only results of the filename query are kept
+    assert sorted(unit.filename for unit in result) == sorted(modular_filenames)
+
+
+def test_get_base_packages_multiple_items(pulp):
+    """test searching at once for items with the same input repos"""
+    depsolver = Depsolver(None, None, None, None)
+
+    repo = create_and_insert_repo(id="test_repo_id", pulp=pulp)
+
+    unit_1 = RpmUnit(
+        name="test",
+        version="100",
+        release="200",
+        epoch="1",
+        arch="x86_64",
+    )
+    unit_2 = RpmUnit(
+        name="foo",
+        version="10",
+        release="200",
+        epoch="1",
+        arch="x86_64",
+    )
+    unit_3 = RpmUnit(
+        name="bar",
+        version="10",
+        release="200",
+        epoch="1",
+        arch="x86_64",
+    )
+
+    pulp.insert_units(repo, [unit_1, unit_2, unit_3])
+
+    item_1 = DepsolverItem({"test", "foo"}, [PackageToExclude("foo")], [repo])
+    item_2 = DepsolverItem({"foo"}, [], [repo])
+
+    with mock.patch(
+        "ubi_manifest.worker.tasks.depsolver.rpm_depsolver.search_rpms",
+        wraps=search_rpms,
+    ) as search:
+        result = depsolver.get_base_packages([item_1, item_2])
+
+    # one query for both items
+    search.assert_called_once()
+    # 'foo' is blacklisted only for the first item, 'bar' isn't whitelisted
+    assert sorted(unit.name for unit in result) == ["foo", "test"]
+
+
 def test_get_pkgs_from_all_modules(pulp):
     """tests getting pkgs filenames from all available modulemd units"""
     depsolver = Depsolver(None, None, None, None)
@@ -348,7 +518,7 @@ def test_run(pulp):
 
             # check internal state of depsolver object
             # provides set holds all capabilities that we went through during depsolving
-            assert depsolver._provided_rpms == rpmdeps_from_names(
+            assert set(depsolver._provided_rpms) == rpmdeps_from_names(
                 "gcc",
                 "jq",
                 "apr",
@@ -363,7 +533,7 @@ def test_run(pulp):
             )
 
             # requires set holds all requires that we went through during depsolving
-            assert depsolver._required_rpms == rpmdeps_from_names(
+            assert set(depsolver._required_rpms) == rpmdeps_from_names(
                 "blacklisted-package",
                 "lib.a",
                 "lib.b",
@@ -818,10 +988,10 @@ def test_run_modular_deps(pulp):
         depsolver.run()
         # check internal state of depsolver object
         # provides set holds all capabilities that we went through during depsolving
-        assert depsolver._provided_rpms == all_provides
+        assert set(depsolver._provided_rpms) == all_provides
 
         # requires set holds all requires that we went through during depsolving
-        assert depsolver._required_rpms == all_requires
+        assert set(depsolver._required_rpms) == all_requires
 
         # unsolved set should be empty after depsolving finishes
         # it will be emptied even if we have unsolvable dependency
@@ -989,9 +1159,9 @@ def test_run_with_skipped_depsolving(pulp):
         depsolver.run()
         # check internal state of depsolver object
         # with provided flag base_pkgs_only:True we don't store any of provides|requires
-        assert depsolver._provided_rpms == set()
+        assert set(depsolver._provided_rpms) == set()
 
-        assert depsolver._required_rpms == set()
+        assert set(depsolver._required_rpms) == set()
 
         assert len(depsolver._unsolved_rpms) == 0
 
@@ -1,7 +1,7 @@
 import pytest
-from pubtools.pulplib import RpmUnit
+from pubtools.pulplib import RpmDependency, RpmUnit
 
-from ubi_manifest.worker.models import UbiUnit
+from ubi_manifest.worker.models import NameIndex, UbiUnit
 
 
 def test_ubi_unit():
@@ -31,3 +31,36 @@ def test_ubi_unit_bad_eq():
     ubi_unit = UbiUnit(unit, repo_id)
 
     assert ubi_unit.__eq__(object()) == NotImplemented
+
+
+def test_name_index():
+    """Test adding, batching and removing dependencies in NameIndex"""
+    dep_a = RpmDependency(name="pkg_a")
+    dep_a_versioned = RpmDependency(name="pkg_a", version="1.0", flags="GE")
+    dep_b = RpmDependency(name="pkg_b")
+    dep_c = RpmDependency(name="pkg_c")
+
+    index = NameIndex([dep_a, dep_a_versioned, dep_b])
+    # duplicates are ignored
+    index.add(RpmDependency(name="pkg_a"))
+    index.add(dep_c)
+
+    assert len(index) == 4
+    assert set(index) == {dep_a, dep_a_versioned, dep_b, dep_c}
+    assert index.get("pkg_a") == [dep_a, dep_a_versioned]
+    assert index.get("missing") == []
+    assert RpmDependency(name="pkg_a", version="1") not in index
+    assert dep_a_versioned in index
+    assert "pkg_a" not in index
+
+    # batch is taken per name, so both pkg_a deps are popped together
+    batch = index.pop_batch(1)
+    assert batch == [dep_a, dep_a_versioned]
+    assert len(index) == 2
+    assert "pkg_a" not in index.by_name
+
+    # removing unknown deps is a no-op
+    index.remove_many([dep_b, dep_a, RpmDependency(name="pkg_c", version="2")])
+    assert set(index) == {dep_c}
+    assert len(index) == 1
+    assert list(index.by_name) == ["pkg_c"]
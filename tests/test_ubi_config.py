@@ -1,6 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
-from ubi_manifest.worker.ubi_config import UbiConfigLoader
+from ubi_manifest.worker.ubi_config import (
+    CONFIG_CACHE_TTL,
+    UbiConfigLoader,
+    get_ubi_config_loader,
+)
 
 from .utils import MockLoader
 
@@ -19,9 +24,9 @@ def test_get_config():
         assert config.content_sets.debuginfo.input == "cs_debug_in"
         assert config.content_sets.debuginfo.output == "cs_debug_out"
 
-        # there should be three entries in the loader._config_map dict
-        # each unique combo of (cs_in, cs_out, version)
-        assert len(loader._config_map.keys()) == 3
+        # there should be six entries in the loader._config_map dict
+        # each unique combo of (cs_in, cs_out, version) of both configs
+        assert len(loader._config_map.keys()) == 6
 
         # check one of the entry
         config_to_check = loader._config_map[("cs_debug_in", "cs_debug_out", "8")]
@@ -34,3 +39,57 @@ def test_get_config():
         # mock_loader ("ubiconfig.get_loader") should be called only once
         # second call of loader.get_config() reads from loader._config_map
         mock_loader.assert_called_once()
+
+        # missing config is looked up in the map without loading again
+        assert loader.get_config("cs_rpm_in", "cs_rpm_out", "9") is None
+        mock_loader.assert_called_once()
+
+
+def test_get_ubi_config_loader():
+    url = "https://foo.bar.com/some-repo.git"
+    with mock.patch("time.monotonic", return_value=1000.0) as monotonic:
+        loader = get_ubi_config_loader(url)
+
+        # the same loader is returned for the same url until it expires
+        assert get_ubi_config_loader(url) is loader
+        assert get_ubi_config_loader("https://foo.bar.com/other.git") is not loader
+
+        monotonic.return_value = 1000.0 + CONFIG_CACHE_TTL + 1
+        new_loader = get_ubi_config_loader(url)
+        assert new_loader is not loader
+        assert get_ubi_config_loader(url) is new_loader
+
+
+def test_get_config_concurrent():
+    with mock.patch("ubiconfig.get_loader", return_value=MockLoader()) as mock_loader:
+        loader = UbiConfigLoader("https://foo.bar.com/some-repo.git")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            configs = list(
+                executor.map(
+                    lambda _: loader.get_config("cs_rpm_in", "cs_rpm_out", "8"),
+                    range(32),
+                )
+            )
+
+        # configs are loaded once and every thread sees the indexed config
+        mock_loader.assert_called_once()
+        assert all(config is configs[0] for config in configs)
+        assert configs[0].version == "8"
+
+
+def test_get_ubi_config_loader_expired():
+    url = "https://foo.bar.com/some-repo.git"
+    key = ("cs_rpm_in", "cs_rpm_out", "8")
+    with mock.patch("ubiconfig.get_loader", return_value=MockLoader()) as mock_loader:
+        with mock.patch("time.monotonic", return_value=1000.0) as monotonic:
+            config = get_ubi_config_loader(url).get_config(*key)
+            assert get_ubi_config_loader(url).get_config(*key) is config
+            mock_loader.assert_called_once()
+
+            # expired loader is replaced and configs are loaded again
+            monotonic.return_value = 1000.0 + CONFIG_CACHE_TTL + 1
+            new_config = get_ubi_config_loader(url).get_config(*key)
+
+    assert mock_loader.call_count == 2
+    assert new_config is not config
+    assert new_config.version == "8"
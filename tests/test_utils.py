@@ -13,17 +13,19 @@ from pubtools.pulplib import (
 from ubi_manifest.worker.models import PackageToExclude, UbiUnit
 from ubi_manifest.worker.ubi_config import UbiConfigLoader
 from ubi_manifest.worker.utils import (
+    CompiledBlacklist,
     create_or_criteria,
+    evr_key,
     flatten_list_of_sets,
     get_criteria_for_modules,
     get_modulemd_output_set,
     get_n_latest_from_content,
+    is_blacklisted,
     is_requirement_resolved,
     keep_n_latest_rpms,
     parse_blacklist_config,
     parse_bool_deps,
     split_filename,
-    vercmp_sort,
 )
 
 from .utils import MockLoader, rpmdeps_from_names
@@ -34,10 +36,8 @@ def get_ubi_unit(klass, repo_id, **kwargs):
     return UbiUnit(pulp_unit, repo_id)
 
 
-def test_vercmp_sort():
-    """Tests all comparison methods for vercmp sort used for RPM packages comparison"""
-    vercmp_klass = vercmp_sort()
-
+def test_evr_key_comparison():
+    """Tests all comparison methods of evr keys used for RPM packages comparison"""
     unit_1 = get_ubi_unit(
         RpmUnit,
         "test_repo_id",
@@ -58,8 +58,8 @@ def test_vercmp_sort():
         arch="x86_64",
     )
 
-    unit_1 = vercmp_klass(unit_1)
-    unit_2 = vercmp_klass(unit_2)
+    unit_1 = evr_key(unit_1)
+    unit_2 = evr_key(unit_2)
 
     assert (unit_1 < unit_2) is True
     assert (unit_1 <= unit_2) is True
@@ -69,6 +69,41 @@ def test_vercmp_sort():
     assert (unit_1 != unit_2) is True
 
 
+def test_evr_key():
+    """Tests sorting of RPM packages by epoch, version and release"""
+    unit_1 = get_ubi_unit(
+        RpmUnit,
+        "test_repo_id",
+        name="test",
+        version="10",
+        release="20",
+        epoch="1",
+        arch="x86_64",
+    )
+    unit_2 = get_ubi_unit(
+        RpmUnit,
+        "test_repo_id",
+        name="test",
+        version="10",
+        release="200",
+        epoch="1",
+        arch="x86_64",
+    )
+    unit_3 = get_ubi_unit(
+        RpmUnit,
+        "test_repo_id",
+        name="test",
+        version="9",
+        release="1",
+        epoch="2",
+        arch="x86_64",
+    )
+
+    assert evr_key(unit_1) < evr_key(unit_2)
+    assert evr_key(unit_1) == evr_key(unit_1)
+    assert sorted([unit_3, unit_2, unit_1], key=evr_key) == [unit_1, unit_2, unit_3]
+
+
 def test_keep_n_latest_rpms():
     """Test keeping only the latest version of rpm"""
     unit_1 = get_ubi_unit(
@@ -90,7 +125,7 @@ def test_keep_n_latest_rpms():
     )
 
     rpms = [unit_1, unit_2]
-    rpms.sort(key=vercmp_sort())
+    rpms.sort(key=evr_key)
     keep_n_latest_rpms(rpms)
 
     # there should only one rpm
@@ -408,6 +443,32 @@ def test_get_n_latest_from_content_skip_modular_rpms():
     assert unit.version == "10"
 
 
+def test_get_n_latest_from_content_with_names():
+    """test that only rpms with given names are considered"""
+    unit_1 = get_ubi_unit(
+        RpmUnit,
+        "test_repo_id",
+        name="test",
+        version="200",
+        release="20",
+        arch="x86_64",
+    )
+    unit_2 = get_ubi_unit(
+        RpmUnit,
+        "test_repo_id",
+        name="other",
+        version="10",
+        release="20",
+        arch="x86_64",
+    )
+
+    result = get_n_latest_from_content([unit_1, unit_2], [], names={"test"})
+    assert result == [unit_1]
+
+    result = get_n_latest_from_content([unit_1, unit_2], [], names=set())
+    assert result == []
+
+
 @pytest.mark.parametrize(
     "clause, result",
     [
@@ -458,6 +519,10 @@ def test_get_n_latest_from_content_skip_modular_rpms():
             "(    ((( pkgA(xxx) >= 0.1.2 with capA    )))     )",
             {"pkgA(xxx)", "capA"},
         ),
+        # case with names starting like operators
+        ("(orca or android-tools if ifuse)", {"orca", "android-tools", "ifuse"}),
+        # case with soname having several parenthesized parts
+        ("(libfoo.so.1()(64bit) if bar)", {"libfoo.so.1()(64bit)", "bar"}),
     ],
 )
 def test_parse_bool_deps(clause, result):
@@ -483,6 +548,21 @@ def test_create_or_criteria():
     # let's not test internal structure of criteria, that's responsibility of pulplib
 
 
+def test_create_or_criteria_duplicates():
+    """Test that duplicate values produce one criteria"""
+    criteria = create_or_criteria(["color"], [("blue",), ("white",), ("blue",)])
+    assert len(criteria) == 2
+
+    criteria = create_or_criteria(
+        ["color", "size"], [("blue", "10"), ("blue", "10"), ("blue", "15")]
+    )
+    assert len(criteria) == 2
+
+    # values are deduplicated, so they have to be hashable
+    with pytest.raises(TypeError):
+        _ = create_or_criteria(["color"], [(["blue"],), (["blue"],)])
+
+
 def test_create_or_criteria_uneven_args():
     """Test wrong number of values in args"""
 
@@ -493,6 +573,10 @@ def test_create_or_criteria_uneven_args():
     with pytest.raises(ValueError):
         _ = create_or_criteria(fields, values)
 
+    # single field variant
+    with pytest.raises(ValueError):
+        _ = create_or_criteria(["color"], [("blue",), ("white", "10")])
+
 
 @pytest.mark.parametrize(
     "filename, name, ver, rel, epoch, arch",
@@ -552,6 +636,71 @@ def test_parse_blacklist():
         assert item.arch is None
 
 
+def test_compiled_blacklist_any_arch():
+    """test that rules for any arch are considered if arch is not given"""
+    blacklist = [
+        PackageToExclude("kernel"),
+        PackageToExclude("kernel-headers", arch="x86_64"),
+        PackageToExclude("package-name", globbing=True),
+        PackageToExclude("lib.c++", globbing=True, arch="s390x"),
+    ]
+    compiled = CompiledBlacklist(blacklist)
+
+    assert compiled.matches("kernel")
+    assert compiled.matches("kernel-headers")
+    assert compiled.matches("package-name-devel")
+    assert compiled.matches("lib.c++-libs")
+    assert not compiled.matches("libxc++")
+    assert not compiled.matches("other-package-name")
+
+    assert not CompiledBlacklist([]).matches("kernel")
+
+
+@pytest.mark.parametrize(
+    "name, arch, expected_result",
+    [
+        ("kernel", "x86_64", True),
+        ("kernel", "s390x", True),
+        ("kernel-devel", "x86_64", False),
+        ("kernel-headers", "x86_64", True),
+        ("kernel-headers", "s390x", False),
+        ("package-name-devel", "noarch", True),
+        ("gcc", "x86_64", False),
+        ("gcc-c++", "s390x", True),
+    ],
+)
+def test_compiled_blacklist(name, arch, expected_result):
+    blacklist = [
+        PackageToExclude("kernel"),
+        PackageToExclude("kernel-headers", arch="x86_64"),
+        PackageToExclude("package-name", globbing=True),
+        PackageToExclude("gcc", globbing=True, arch="s390x"),
+    ]
+    assert CompiledBlacklist(blacklist).matches(name, arch) is expected_result
+
+
+def test_compiled_blacklist_empty_arch():
+    """test that rule with empty arch applies to any arch"""
+    compiled = CompiledBlacklist([PackageToExclude("kernel", arch="")])
+
+    for arch in ("x86_64", "s390x"):
+        package = get_ubi_unit(
+            RpmUnit, "test_repo_id", name="kernel", version="1", arch=arch
+        )
+        assert compiled.matches(package.name, package.arch) is True
+        # the same as matching rule by rule
+        assert is_blacklisted(package, [PackageToExclude("kernel", arch="")])
+
+
+def test_compiled_blacklist_of():
+    blacklist = [PackageToExclude("kernel")]
+    compiled = CompiledBlacklist.of(blacklist)
+
+    assert isinstance(compiled, CompiledBlacklist)
+    # compiled blacklist is not compiled again
+    assert CompiledBlacklist.of(compiled) is compiled
+
+
 def test_get_modulemd_output_set():
     # Define mock UbiUnits
 
@@ -608,6 +757,19 @@ def test_get_modulemd_output_set():
     assert output_set == expected_output_set
 
 
+def test_get_modulemd_output_set_ambiguous_name_stream():
+    # concatenated name and stream of these modules are the same
+    module1 = ModulemdUnit(
+        name="perl", stream="5.30", version=8, context="abc", arch="x86_64"
+    )
+    module2 = ModulemdUnit(
+        name="perl5", stream=".30", version=9, context="abc", arch="x86_64"
+    )
+
+    output_set = get_modulemd_output_set([module1, module2])
+    assert output_set == [module1, module2]
+
+
 def test_get_criteria_for_modules():
     # define units to search
     unit1 = ModulemdDependency(
@@ -624,11 +786,18 @@ def test_get_criteria_for_modules():
         name="perl-YAML",
     )
 
-    expected_criteria = create_or_criteria(
-        ("name", "stream"),
-        [("perl", "5.30"), ("perl", "6.30"), ("perl-YAML", Matcher.exists())],
-    )
-    criteria = get_criteria_for_modules([unit1, unit2, unit3])
+    expected_criteria = [
+        Criteria.and_(
+            Criteria.with_field("name", name), Criteria.with_field("stream", stream)
+        )
+        for name, stream in [
+            ("perl", "5.30"),
+            ("perl", "6.30"),
+            ("perl-YAML", Matcher.exists()),
+        ]
+    ]
+    criteria = get_criteria_for_modules([unit1, unit2, unit3, unit1])
+    assert criteria == expected_criteria
 
 
 @pytest.mark.parametrize(
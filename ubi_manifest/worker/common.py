@@ -38,11 +38,11 @@ def get_pkgs_from_all_modules(repos: list[YumRepository]) -> set[str]:
     """
 
     def extract_modular_filenames() -> set[str]:
-        filenames = set()
-        for module in modules:  # type: ignore [attr-defined]
-            filenames |= set(module.artifacts_filenames)
-
-        return filenames
+        return {
+            filename
+            for module in modules  # type: ignore [attr-defined]
+            for filename in module.artifacts_filenames
+        }
 
     modules = search_modulemds([Criteria.true()], repos)
     return extract_modular_filenames()
@@ -1,7 +1,9 @@
+from collections.abc import Iterable, Iterator
+from itertools import chain, islice
 from typing import Any, Optional
 
 from attrs import define
-from pubtools.pulplib import Unit, YumRepository
+from pubtools.pulplib import RpmDependency, Unit, YumRepository
 from ubiconfig.config_types.modules import Module
 
 
@@ -37,6 +39,76 @@ class UbiUnit:
         return NotImplemented
 
 
+class NameIndex:
+    """
+    Collection of unique RpmDependency items indexed by their name.
+    """
+
+    def __init__(self, items: Iterable[RpmDependency] = ()) -> None:
+        self.by_name: dict[str, list[RpmDependency]] = {}
+        self.total_count = 0
+        self.update(items)
+
+    def __len__(self) -> int:
+        return self.total_count
+
+    def __iter__(self) -> Iterator[RpmDependency]:
+        return chain.from_iterable(self.by_name.values())
+
+    def __contains__(self, dep: object) -> bool:
+        if not isinstance(dep, RpmDependency):
+            return False
+        return dep in self.by_name.get(dep.name, ())
+
+    def add(self, dep: RpmDependency) -> None:
+        """
+        Adds given dependency to the index unless it's already present.
+        """
+        deps = self.by_name.setdefault(dep.name, [])
+        if dep not in deps:
+            deps.append(dep)
+            self.total_count += 1
+
+    def update(self, deps: Iterable[RpmDependency]) -> None:
+        """
+        Adds all given dependencies to the index.
+        """
+        for dep in deps:
+            self.add(dep)
+
+    def get(self, name: str) -> list[RpmDependency]:
+        """
+        Returns all dependencies with given name.
+        """
+        return self.by_name.get(name, [])
+
+    def pop_batch(self, n: int) -> list[RpmDependency]:
+        """
+        Removes and returns dependencies of up to `n` names from the index.
+        """
+        batch = []
+        for name in list(islice(self.by_name, n)):
+            batch.extend(self.by_name.pop(name))
+        self.total_count -= len(batch)
+        return batch
+
+    def remove_many(self, deps: Iterable[RpmDependency]) -> None:
+        """
+        Removes given dependencies from the index, missing ones are ignored.
+        """
+        for dep in deps:
+            same_name = self.by_name.get(dep.name)
+            if not same_name:
+                continue
+            try:
+                same_name.remove(dep)
+            except ValueError:
+                continue
+            self.total_count -= 1
+            if not same_name:
+                del self.by_name[dep.name]
+
+
 @define
 class PackageToExclude:
     """
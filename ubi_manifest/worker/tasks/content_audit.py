@@ -11,9 +11,12 @@ from ubi_manifest.worker.common import filter_whitelist, get_pkgs_from_all_modul
 from ubi_manifest.worker.models import PackageToExclude, UbiUnit
 from ubi_manifest.worker.pulp_queries import search_units
 from ubi_manifest.worker.tasks.celery import app
-from ubi_manifest.worker.ubi_config import UbiConfigLoader, get_content_config
+from ubi_manifest.worker.ubi_config import (
+    get_content_config,
+    get_ubi_config_loader,
+)
 from ubi_manifest.worker.utils import (
-    RELATION_CMP_MAP,
+    compare_evr,
     create_or_criteria,
     get_criteria_for_modules,
     is_blacklisted,
@@ -36,7 +39,9 @@ def content_audit_task() -> None:
     content is present, and that blacklisted content is absent.
     """
 
-    config_loaders = [UbiConfigLoader(url) for url in app.conf.content_config.values()]
+    config_loaders = [
+        get_ubi_config_loader(url) for url in app.conf.content_config.values()
+    ]
 
     with make_pulp_client(app.conf) as client:
         for out_repo in client.search_repository(
@@ -263,6 +268,6 @@ def _compare_versions(repo_id: str, out_unit: UbiUnit, in_unit: UbiUnit) -> None
     if out_unit.content_type_id == "rpm":
         out_evr = (out_unit.epoch, out_unit.version, out_unit.release)
         in_evr = (in_unit.epoch, in_unit.version, in_unit.release)
-        if RELATION_CMP_MAP["LT"](out_evr, in_evr):  # type: ignore [no-untyped-call]
+        if compare_evr("LT", out_evr, in_evr):
             log_warning((out_unit.name, out_evr, in_evr))
             return
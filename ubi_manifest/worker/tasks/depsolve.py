@@ -18,7 +18,10 @@ from ubi_manifest.worker.common import filter_whitelist
 from ubi_manifest.worker.models import DepsolverItem, ModularDepsolverItem, UbiUnit
 from ubi_manifest.worker.tasks.celery import app
 from ubi_manifest.worker.tasks.depsolver import Depsolver, ModularDepsolver
-from ubi_manifest.worker.ubi_config import UbiConfigLoader, get_content_config
+from ubi_manifest.worker.ubi_config import (
+    get_content_config,
+    get_ubi_config_loader,
+)
 from ubi_manifest.worker.utils import (
     make_pulp_client,
     parse_blacklist_config,
@@ -48,7 +51,7 @@ def depsolve_task(ubi_repo_ids: Iterable[str], content_config_url: str) -> None:
     (source_repo_id, unit_type, unit_attr, value). Note that value in redis
     is stored as json string.
     """
-    ubi_config_loader = UbiConfigLoader(content_config_url)
+    ubi_config_loader = get_ubi_config_loader(content_config_url)
 
     with make_pulp_client(app.conf) as client:
         depsolver_flags = {}  # (input_cs, ubi_repo_id): {"flag_x": "value"}
@@ -37,7 +37,7 @@ class ModularDepsolver:
         for module in chain.from_iterable(
             item.modulelist for item in self._modular_items
         ):
-            key = f"{module.name}:{module.stream}"
+            key = (module.name, module.stream)
             self._profiles[key] = module.profiles
 
         # executor for this class, not adding retries because for pulp
@@ -145,7 +145,7 @@ class ModularDepsolver:
             pkg_names: list[str] = []
 
             if module.profiles:
-                key = f"{module.name}:{module.stream}"
+                key = (module.name, module.stream)
                 for profile in self._profiles.get(key) or []:
                     pkg_names.extend(module.profiles.get(profile) or [])
 
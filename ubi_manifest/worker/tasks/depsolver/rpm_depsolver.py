@@ -2,21 +2,27 @@ from __future__ import annotations
 
 import logging
 import os
+from collections import defaultdict
+from collections.abc import Iterable
 from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from itertools import chain
-from typing import Any
+from typing import Any, Optional, Union
 
 from more_executors import Executors
-from more_executors.futures import f_proxy
 from pubtools.pulplib import RpmDependency, YumRepository
 
 from ubi_manifest.worker.common import get_pkgs_from_all_modules
-from ubi_manifest.worker.models import DepsolverItem, PackageToExclude, UbiUnit
+from ubi_manifest.worker.models import (
+    DepsolverItem,
+    NameIndex,
+    PackageToExclude,
+    UbiUnit,
+)
 from ubi_manifest.worker.pulp_queries import search_rpms
 from ubi_manifest.worker.utils import (
+    CompiledBlacklist,
     create_or_criteria,
     get_n_latest_from_content,
-    is_blacklisted,
     is_requirement_resolved,
     parse_bool_deps,
 )
@@ -53,26 +59,30 @@ class Depsolver:
 
         self._srpm_repos: list[Future[YumRepository]] = srpm_repos
 
-        self._provided_rpms: set[RpmDependency] = (
-            set()
-        )  # set of rpm.provides we've visited
-        self._required_rpms: set[RpmDependency] = (
-            set()
-        )  # set of rpm.requires we've visited
+        # indexes of rpm.provides/rpm.requires we've visited
+        self._provided_rpms: NameIndex = NameIndex()
+        self._required_rpms: NameIndex = NameIndex()
+
+        # index of files required by visited RPMs
+        self._required_files: NameIndex = NameIndex()
+        # set of files provided by visited RPMs
+        self._provided_files: set[str] = set()
 
-        self._required_files: set[RpmDependency] = (
-            set()
-        )  # set of files required by visited RPMs
-        self._provided_files: set[RpmDependency] = (
-            set()
-        )  # set of files provided by visited RPMs
+        # indexes of solvables (pkg, lib, ...) that we use for checking remaining requires
+        self._unsolved_rpms: NameIndex = NameIndex()
+        self._unsolved_files: NameIndex = NameIndex()
 
-        # sets of solvables (pkg, lib, ...) that we use for checking remaining requires
-        self._unsolved_rpms: set[RpmDependency] = set()
-        self._unsolved_files: set[RpmDependency] = set()
+        # filenames of RPMs whose requires and provides were already extracted
+        self._processed_filenames: set[str] = set()
 
         # Set of all modular rpms. Modifying the given modular_rpm_filenames set in place
-        self._modular_rpm_filenames: set[str] = modular_rpm_filenames
+        self._all_modular_rpm_filenames: set[str] = modular_rpm_filenames
+        # immutable snapshot of the set above, shared by worker threads for filtering
+        self._modular_rpm_filenames: frozenset[str] = frozenset(
+            modular_rpm_filenames or ()
+        )
+        # pending query populating the set of modular rpms, if any
+        self._modular_rpm_filenames_ft: Optional[Future[None]] = None
 
         self._executor: ThreadPoolExecutor = Executors.thread_pool(  # type: ignore [assignment]
             max_workers=MAX_WORKERS
@@ -85,86 +95,129 @@ class Depsolver:
     def __exit__(self, *args: Any, **kwargs: Any) -> None:
         self._executor.__exit__(*args, **kwargs)
 
+    def _load_modular_rpm_filenames(self, repos: list[YumRepository]) -> None:
+        self._all_modular_rpm_filenames.update(get_pkgs_from_all_modules(repos))
+        self._modular_rpm_filenames = frozenset(self._all_modular_rpm_filenames)
+
+    def _get_modular_rpm_filenames(self) -> frozenset[str]:
+        """
+        Returns filenames of all modular rpms, waiting for their query if needed.
+        """
+        if self._modular_rpm_filenames_ft is not None:
+            self._modular_rpm_filenames_ft.result()
+        return self._modular_rpm_filenames
+
     def get_base_packages(
         self,
-        repos: list[YumRepository],
-        pkgs_list: set[str],
-        blacklist: list[PackageToExclude],
+        items: list[DepsolverItem],
+        modular_pkgs: Optional[set[str]] = None,
     ) -> list[UbiUnit]:
         """
-        Query RPMs for given `pkg_list`, returning only latest versions of results.
+        Query RPMs for whitelists of given `items`, returning only latest versions
+        of results. All items are expected to have the same input repos, so their
+        whitelists are searched within one query.
+        Modular RPMs with filenames in `modular_pkgs` are searched concurrently
+        in a separate query and returned without any filtering.
         """
-        crit = create_or_criteria(["name"], [(rpm,) for rpm in pkgs_list])
-
-        content = f_proxy(
-            self._executor.submit(search_rpms, crit, repos, BATCH_SIZE_RPM)
-        )
-
-        newest_rpms = get_n_latest_from_content(
-            content, blacklist, self._modular_rpm_filenames  # type: ignore [arg-type]
-        )
+        repos = items[0].in_pulp_repos
+        all_pkgs: set[str] = set().union(*(item.whitelist for item in items))
+        crit = create_or_criteria(["name"], [(rpm,) for rpm in all_pkgs])
+        content_ft = search_rpms(crit, repos, BATCH_SIZE_RPM)
+
+        modular_ft = None
+        if modular_pkgs:
+            # specific search by filename may use larger batches than search by name
+            filename_crit = create_or_criteria(
+                ["filename"], [(rpm,) for rpm in modular_pkgs]
+            )
+            modular_ft = search_rpms(filename_crit, repos, BATCH_SIZE_RPM_SPECIFIC)
+
+        # this runs in a worker thread already, wait for the queries here
+        content = content_ft.result()
+
+        newest_rpms = []
+        for item in items:
+            # each item has its own whitelist and blacklist
+            newest_rpms.extend(
+                get_n_latest_from_content(
+                    content,
+                    item.blacklist,
+                    self._get_modular_rpm_filenames(),
+                    names=item.whitelist,
+                )
+            )
+        if modular_ft is not None:
+            newest_rpms.extend(modular_ft.result())
 
         return newest_rpms
 
-    def get_modulemd_packages(
-        self, repos: list[YumRepository], pkgs_list: set[str]
-    ) -> Future[Future[set[UbiUnit]]]:
-        """
-        Search for modular rpms.
-        """
-        crit = create_or_criteria(["filename"], [(rpm,) for rpm in pkgs_list])
-
-        content = f_proxy(
-            self._executor.submit(search_rpms, crit, repos, BATCH_SIZE_RPM_SPECIFIC)
-        )
-        return content
-
-    def extract_and_resolve(self, content: set[UbiUnit]) -> None:
+    def extract_and_resolve(self, content: Iterable[UbiUnit]) -> None:
         """
         Extracts provides and requires from content and sets internal
         state of self accordingly.
         """
-        _required_rpms = set()
-        _required_files = set()
+        _required_rpms = []
+        _required_files = []
+        _provided_rpms = []
         for rpm in content:
+            # the same RPM may be pulled from more repos or in more resolver rounds
+            if rpm.filename:
+                if rpm.filename in self._processed_filenames:
+                    continue
+                self._processed_filenames.add(rpm.filename)
+
+            # requires seen in previously processed content are skipped,
+            # they are either unsolved already or have been solved
             for item in rpm.requires:
-                if item.name.startswith("/"):
-                    _required_files.add(item)
-                elif item.name.startswith("("):
+                name = item.name
+                first_char = name[:1]
+                if first_char == "/":
+                    if item not in self._required_files:
+                        _required_files.append(item)
+                elif first_char == "(":
                     # add parsed bool deps to requires that need solving
-                    _required_rpms |= parse_bool_deps(item.name)
-                else:
-                    _required_rpms.add(item)
+                    _required_rpms.extend(
+                        dep
+                        for dep in parse_bool_deps(name)
+                        if dep not in self._required_rpms
+                    )
+                elif item not in self._required_rpms:
+                    _required_rpms.append(item)
 
-            for item in rpm.provides:
-                # add to global provides
-                self._provided_rpms.add(item)
+            _provided_rpms.extend(rpm.provides)
 
-            for filename in rpm.files or []:
-                self._provided_files.add(RpmDependency(name=filename))
+            self._provided_files.update(rpm.files or [])
 
-        # update global requires
-        self._required_rpms |= _required_rpms
-        self._required_files |= _required_files
+        # update global provides and requires
+        self._provided_rpms.update(_provided_rpms)
+        self._required_rpms.update(_required_rpms)
+        self._required_files.update(_required_files)
         # add new requires to unsolved
-        self._unsolved_rpms |= _required_rpms
-        self._unsolved_files |= _required_files - self._provided_files
-
-        for prov in self._provided_rpms:
-            solved = set()
-            for req in self._unsolved_rpms:
-                if prov.name != req.name:
-                    continue
-                if is_requirement_resolved(req, prov):
-                    solved.add(req)
-            self._unsolved_rpms -= solved
+        self._unsolved_rpms.update(_required_rpms)
+        files = self._provided_files
+        self._unsolved_files.update(f for f in _required_files if f.name not in files)
+
+        # only requires with a new name or a new provider could have been solved
+        names_to_check = {item.name for item in _required_rpms}
+        names_to_check.update(item.name for item in _provided_rpms)
+        for name in names_to_check:
+            reqs = self._unsolved_rpms.get(name)
+            provs = self._provided_rpms.get(name)
+            if not reqs or not provs:
+                continue
+            solved = [
+                req
+                for req in reqs
+                if any(is_requirement_resolved(req, prov) for prov in provs)
+            ]
+            self._unsolved_rpms.remove_many(solved)
 
     def what_provides(
         self,
         list_of_requires: list[RpmDependency],
         field: str,
         repos: list[YumRepository],
-        blacklist: list[PackageToExclude],
+        blacklist: Union[list[PackageToExclude], CompiledBlacklist],
     ) -> list[UbiUnit]:
         """
         Get the latest rpms that provides requirements from list_of_requires in given repos
@@ -173,40 +226,56 @@ class Depsolver:
         # for given requirement. It should be decided which one should get into
         # the output. Currently we'll get all matching the query.
         crit = create_or_criteria([field], [(item.name,) for item in list_of_requires])
-        content = f_proxy(
-            self._executor.submit(search_rpms, crit, repos, BATCH_SIZE_RPM)
-        )
+        content = search_rpms(crit, repos, BATCH_SIZE_RPM).result()
         return get_n_latest_from_content(
-            content, blacklist, self._modular_rpm_filenames  # type: ignore [arg-type]
+            content,
+            blacklist,
+            self._get_modular_rpm_filenames(),
         )
 
     def resolve_files(
-        self, repos: list[YumRepository], blacklist: list[PackageToExclude]
-    ) -> list[UbiUnit]:
+        self,
+        repos: list[YumRepository],
+        blacklist: Union[list[PackageToExclude], CompiledBlacklist],
+    ) -> list[Future[list[UbiUnit]]]:
         """
-        Resolves file dependencies.
+        Resolves all unsolved file dependencies. Returns futures of queries
+        submitted in batches.
         """
-        batch = []
-        for _ in range(min(len(self._unsolved_files), BATCH_SIZE_RESOLVER)):
-            batch.append(self._unsolved_files.pop())
-        return self.what_provides(batch, "files", repos, blacklist)
+        fts = []
+        while self._unsolved_files:
+            batch = self._unsolved_files.pop_batch(BATCH_SIZE_RESOLVER)
+            fts.append(
+                self._executor.submit(
+                    self.what_provides, batch, "files", repos, blacklist
+                )
+            )
+        return fts
 
     def resolve_rpms(
-        self, repos: list[YumRepository], blacklist: list[PackageToExclude]
-    ) -> list[UbiUnit]:
+        self,
+        repos: list[YumRepository],
+        blacklist: Union[list[PackageToExclude], CompiledBlacklist],
+    ) -> list[Future[list[UbiUnit]]]:
         """
-        Resolves RPM dependencies.
+        Resolves all unsolved RPM dependencies. Returns futures of queries
+        submitted in batches.
         """
-        batch = []
-        for _ in range(min(len(self._unsolved_rpms), BATCH_SIZE_RESOLVER)):
-            batch.append(self._unsolved_rpms.pop())
-        return self.what_provides(batch, "provides.name", repos, blacklist)
+        fts = []
+        while self._unsolved_rpms:
+            batch = self._unsolved_rpms.pop_batch(BATCH_SIZE_RESOLVER)
+            fts.append(
+                self._executor.submit(
+                    self.what_provides, batch, "provides.name", repos, blacklist
+                )
+            )
+        return fts
 
     def get_source_pkgs(
         self,
         binary_rpms: set[UbiUnit],
         binary_repos: list[YumRepository],
-        blacklist: list[PackageToExclude],
+        blacklist: Union[list[PackageToExclude], CompiledBlacklist],
     ) -> set[UbiUnit]:
         """
         Retrieves source packages by querying associated source repositories.
@@ -229,23 +298,20 @@ class Depsolver:
             # exclude these RPMs from future iterations
             rpms -= matched_rpms
 
-            # submit a query for the source RPMs in this repo
-            crit = create_or_criteria(
-                ["filename"], [(rpm.sourcerpm,) for rpm in matched_rpms]
-            )
-            content_fts.append(
-                self._executor.submit(
-                    search_rpms, crit, [srpm_repo], BATCH_SIZE_RPM_SPECIFIC
-                )
-            )
+            # submit a query for the source RPMs in this repo, several binary
+            # RPMs usually share one source RPM so query each filename once
+            sourcerpms = {rpm.sourcerpm for rpm in matched_rpms}
+            crit = create_or_criteria(["filename"], [(name,) for name in sourcerpms])
+            content_fts.append(search_rpms(crit, [srpm_repo], BATCH_SIZE_RPM_SPECIFIC))
 
+        compiled_blacklist = CompiledBlacklist.of(blacklist)
         out = set()
         for content_ft in as_completed(content_fts):
             out.update(
                 {
                     srpm
-                    for srpm in content_ft.result()  # type: ignore [attr-defined]
-                    if not is_blacklisted(srpm, blacklist)
+                    for srpm in content_ft.result()
+                    if not compiled_blacklist.matches(srpm.name, srpm.arch)
                 }
             )
 
@@ -260,110 +326,98 @@ class Depsolver:
             B. set internal state of self accordingly to the content acquired
             C. request new content that provides remaining requirements
             D. content that provides requirements is added to self.output_set
-        3. During phase 1. and 2. source RPM packages are queried for already acquired RPMS.
+        3. Source RPM packages are queried at once for all acquired RPMs.
         """
-        pulp_repos = list(
-            chain.from_iterable([repo.in_pulp_repos for repo in self.repos])
-        )
-
-        # Get modular rpms if they are not already populated from the previous run of the depsolver
-        if not self._modular_rpm_filenames:
-            self._modular_rpm_filenames.update(
-                f_proxy(
-                    self._executor.submit(
-                        get_pkgs_from_all_modules, pulp_repos  # type: ignore [arg-type]
-                    )
-                )
+        # collect input repos and blacklists in one pass, items with the same
+        # input repos are searched for base rpms at once
+        pulp_repos: list[YumRepository] = []
+        merged_blacklist: list[PackageToExclude] = []
+        items_per_repos: dict[tuple[str, ...], list[DepsolverItem]] = {}
+        for item in self.repos:
+            pulp_repos.extend(item.in_pulp_repos)
+            merged_blacklist.extend(item.blacklist)
+            key = tuple(repo.id for repo in item.in_pulp_repos)
+            items_per_repos.setdefault(key, []).append(item)
+        # merged blacklist is compiled once for all resolver and source queries
+        compiled_blacklist = CompiledBlacklist(merged_blacklist)
+
+        # Get modular rpms if they are not already populated from the previous run of the depsolver,
+        # the query runs in background and is awaited only once modular rpms are needed
+        if not self._all_modular_rpm_filenames:
+            self._modular_rpm_filenames_ft = self._executor.submit(
+                self._load_modular_rpm_filenames, pulp_repos
             )
 
-        merged_blacklist = list(
-            chain.from_iterable([repo.blacklist for repo in self.repos])
-        )
-
-        # search for base rpms
+        # search for base rpms together with modulemd binary/debug rpm dependencies
         content_fts = [
             self._executor.submit(
-                self.get_base_packages,
-                repo.in_pulp_repos,
-                repo.whitelist,
-                repo.blacklist,
+                self.get_base_packages, items, self.modulemd_dependencies
             )
-            for repo in self.repos
+            for items in items_per_repos.values()
         ]
 
-        # Get modulemd binary/debug rpm dependencies
-        if self.modulemd_dependencies:
-            content_fts.append(
-                self._executor.submit(
-                    self.get_modulemd_packages,  # type: ignore [arg-type]
-                    pulp_repos,
-                    self.modulemd_dependencies,
-                )
-            )
-
         # wait for base and binary/debug module packages
         for content in as_completed(content_fts):
             self.output_set.update(content.result())
 
         self._log_missing_base_pkgs()
 
-        to_resolve = set(self.output_set)
-        while not self._base_pkgs_only:
+        if not self._base_pkgs_only:
             # extract provides and requires
-            self.extract_and_resolve(to_resolve)
-            # we are finished if _unsolved_rpms/files are empty
-            if not self._unsolved_rpms and not self._unsolved_files:
-                break
-            # get new content that provides required RPMs and files
-            resolved = self.resolve_rpms(pulp_repos, merged_blacklist)
-            resolved.extend(self.resolve_files(pulp_repos, merged_blacklist))
-            # add content to the output set
-            self.output_set.update(resolved)
-            # new content needs resolving
-            to_resolve = set(resolved)
+            self.extract_and_resolve(self.output_set)
+        # we are finished if _unsolved_rpms/files are empty
+        while self._unsolved_rpms or self._unsolved_files:
+            # get new content that provides all required RPMs and files,
+            # batches of queries are independent so run them concurrently
+            resolver_fts = self.resolve_rpms(pulp_repos, compiled_blacklist)
+            resolver_fts.extend(self.resolve_files(pulp_repos, compiled_blacklist))
+            # new content needs resolving, process it as soon as it arrives
+            # so that next requires are collected while other queries run
+            for resolver_ft in as_completed(resolver_fts):
+                resolved = resolver_ft.result()
+                # add content to the output set
+                self.output_set.update(resolved)
+                self.extract_and_resolve(resolved)
 
         self.srpm_output_set.update(
-            self.get_source_pkgs(self.output_set, pulp_repos, merged_blacklist)
+            self.get_source_pkgs(self.output_set, pulp_repos, compiled_blacklist)
         )
 
         if not self._base_pkgs_only:
             # log warnings if depsolving failed
-            deps_not_found = {req.name for req in self._required_rpms} - {
-                prov.name for prov in self._provided_rpms
-            }
-            deps_not_found |= {req.name for req in self._required_files} - {
-                prov.name for prov in self._provided_files
-            }
+            deps_not_found = (
+                self._required_rpms.by_name.keys() - self._provided_rpms.by_name.keys()
+            )
+            deps_not_found |= self._required_files.by_name.keys() - self._provided_files
             if deps_not_found:
-                self._log_warnings(deps_not_found, pulp_repos, merged_blacklist)
+                self._log_warnings(deps_not_found, pulp_repos, compiled_blacklist)
 
     def export(self) -> dict[str, list[UbiUnit]]:
         """
         Prepares output, deduplicating units while keeping identical RPMs from
         different repositories.
         """
-        out: dict[str, list[UbiUnit]] = {}
-        # set of unique tuples (filename, repo_id)
-        filename_repo_tuples: set[tuple[str, str]] = set()
-        for item in self.output_set | self.srpm_output_set:
-            # deduplicate output sets, but keep identical rpms that have different repository
-            # we can't easily decide which one we should keep/discard.
-            # one SRPM can be shared with more than one binary/debug RPM
-            # one debug RPM may be related with more binary RPMs
-            if (
-                item.filename,
-                item.associate_source_repo_id,
-            ) not in filename_repo_tuples:
-                filename_repo_tuples.add((item.filename, item.associate_source_repo_id))
-                out.setdefault(item.associate_source_repo_id, []).append(item)
+        # deduplicate output sets, but keep identical rpms that have different repository
+        # we can't easily decide which one we should keep/discard.
+        # one SRPM can be shared with more than one binary/debug RPM
+        # one debug RPM may be related with more binary RPMs
+        unique_items: dict[tuple[str, str], UbiUnit] = {}
+        for item in chain(self.output_set, self.srpm_output_set):
+            unique_items.setdefault(
+                (item.filename, item.associate_source_repo_id), item
+            )
 
-        return out
+        out: dict[str, list[UbiUnit]] = defaultdict(list)
+        for (_, repo_id), item in unique_items.items():
+            out[repo_id].append(item)
+
+        return dict(out)
 
     def _log_warnings(
         self,
         deps_not_found: set[str],
         pulp_repos: list[YumRepository],
-        merged_blacklist: list[PackageToExclude],
+        merged_blacklist: Union[list[PackageToExclude], CompiledBlacklist],
     ) -> None:
         """
         Log failed depsolving. We print out the rpms whose direct dependencies
@@ -372,10 +426,7 @@ class Depsolver:
         input_repos = [x.id for x in pulp_repos]
 
         # To determine if dep is missing due to being blacklisted
-        def _is_blacklisted_by_rule(item: str, rule: PackageToExclude) -> bool:
-            if rule.globbing:
-                return item.startswith(rule.name)
-            return item == rule.name
+        compiled_blacklist = CompiledBlacklist.of(merged_blacklist)
 
         def _requires_names(requires: list[RpmDependency]) -> set[str]:
             out = set()
@@ -386,16 +437,18 @@ class Depsolver:
                     out.add(item.name)
             return out
 
+        # Map names of requires to rpms depending on them
+        depending_rpms_map: dict[str, list[str]] = {}
+        for rpm in self.output_set:
+            for name in _requires_names(rpm.requires):
+                depending_rpms_map.setdefault(name, []).append(rpm.filename)
+
         # Get rpms depending on missing dependencies
         for item in deps_not_found:
-            depending_rpms = list(
-                rpm.filename
-                for rpm in self.output_set
-                if item in _requires_names(rpm.requires)
-            )
+            depending_rpms = depending_rpms_map.get(item, [])
 
             # Divide missing dependencies blacklisted and all others
-            if any((_is_blacklisted_by_rule(item, rule) for rule in merged_blacklist)):
+            if compiled_blacklist.matches(item):
                 _LOG.warning(
                     "Failed depsolving: %s is blacklisted. These rpms depend on it %s",
                     item,
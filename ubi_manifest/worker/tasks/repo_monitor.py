@@ -23,11 +23,13 @@ def repo_monitor_task() -> None:
     """
 
     to_log = {}
+    # all repositories are checked against the same point in time
+    now = datetime.now()
     with make_pulp_client(app.conf) as client:
         criteria = Criteria.with_field("ubi_population", True)
         repos = client.search_repository(criteria)
         for repo in repos:
-            result = _check_last_publish(repo)
+            result = _check_last_publish(repo, now)
 
             if result:
                 to_log[repo.id] = result
@@ -35,14 +37,14 @@ def repo_monitor_task() -> None:
     _log_findings(to_log)
 
 
-def _check_last_publish(repository: Future[Repository]) -> Union[str, None]:
+def _check_last_publish(
+    repository: Future[Repository], now: datetime
+) -> Union[str, None]:
     out = None
     limit = app.conf.publish_limit
-    current_time = datetime.now()
     for distributor in repository.distributors:  # type: ignore
         if distributor.is_rsync:
-            time_diff = current_time - distributor.last_publish
-            td_hrs = time_diff.days * 24 + time_diff.seconds / 3600
+            td_hrs = (now - distributor.last_publish).total_seconds() / 3600
             _LOG.debug(
                 "Last publish check: %s, last_publish: %s, diff: %.2f",
                 repository.id,  # type: ignore
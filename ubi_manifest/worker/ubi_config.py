@@ -1,7 +1,16 @@
+import os
+import threading
+import time
 from typing import Any, Optional
 
 import ubiconfig
 
+# loaded configs are reused within the process for this time, in seconds
+CONFIG_CACHE_TTL = int(os.getenv("UBI_MANIFEST_CONFIG_CACHE_TTL", "300"))
+
+_LOADERS: dict[str, tuple[float, "UbiConfigLoader"]] = {}
+_LOADERS_LOCK = threading.Lock()
+
 
 class ContentConfigMissing(Exception):
     """
@@ -18,16 +27,27 @@ class UbiConfigLoader:
         self._url_or_dir: str = url_or_dir  # url or path to directory
         self._config_map: dict[tuple[str, str, str], ubiconfig.UbiConfig] = {}
         self._all_config: Optional[list[ubiconfig.UbiConfig]] = None
+        # loader may be shared by threads, configs are loaded only once
+        self._lock = threading.Lock()
 
     @property
     def all_config(self) -> list[ubiconfig.UbiConfig]:
         """
         A list of all configurations loaded from UbiConfigLoader's url/dir.
         """
-        if self._all_config is None:
-            self._all_config = self._load_all()
-
-        return self._all_config
+        with self._lock:
+            if self._all_config is None:
+                all_config = self._load_all()
+                # index all configs at once, first config wins for duplicate keys
+                config_map: dict[tuple[str, str, str], ubiconfig.UbiConfig] = {}
+                for config in all_config:
+                    for cs_in, cs_out in self._content_sets(config):
+                        config_map.setdefault((cs_in, cs_out, config.version), config)
+                # the map is set first, so it's complete once configs are visible
+                self._config_map = config_map
+                self._all_config = all_config
+
+            return self._all_config
 
     def _load_all(self) -> Any:
         loader = ubiconfig.get_loader(self._url_or_dir)
@@ -35,27 +55,13 @@ class UbiConfigLoader:
 
     def get_config(
         self, input_cs: str, output_cs: str, version: str
-    ) -> ubiconfig.UbiConfig:
+    ) -> Optional[ubiconfig.UbiConfig]:
         """
         Gets and returns UbiConfig for given input content set,
         output content set and a version
         """
-        out = self._config_map.get((input_cs, output_cs, version)) or None
-
-        if out is None:
-            for config in self.all_config:
-                for cs_in, cs_out in self._content_sets(config):
-                    self._config_map.setdefault((cs_in, cs_out, config.version), config)
-
-                if config.version == version:
-                    if (
-                        input_cs,
-                        output_cs,
-                    ) in self._content_sets(config):
-                        out = config
-                        break
-
-        return out
+        _ = self.all_config  # ensure configs are loaded and indexed
+        return self._config_map.get((input_cs, output_cs, version))
 
     @staticmethod
     def _content_sets(config: ubiconfig.UbiConfig) -> list[tuple[str, str]]:
@@ -75,6 +81,22 @@ class UbiConfigLoader:
         ]
 
 
+def get_ubi_config_loader(url_or_dir: str) -> UbiConfigLoader:
+    """
+    Returns UbiConfigLoader for given url/dir shared within the process,
+    so configs are not loaded again by each task. The loader is replaced
+    once it's older than CONFIG_CACHE_TTL, so config changes are picked up.
+    """
+    now = time.monotonic()
+    with _LOADERS_LOCK:
+        cached = _LOADERS.get(url_or_dir)
+        if cached is None or now - cached[0] > CONFIG_CACHE_TTL:
+            cached = (now, UbiConfigLoader(url_or_dir))
+            _LOADERS[url_or_dir] = cached
+
+    return cached[1]
+
+
 def get_content_config(
     ubi_config_loader: UbiConfigLoader, input_cs: str, output_cs: str, version: str
 ) -> ubiconfig.UbiConfig:
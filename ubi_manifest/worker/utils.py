@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import heapq
+import operator
 import os
 import re
 from collections import defaultdict, deque
-from itertools import chain
+from functools import cmp_to_key, lru_cache
 from logging import getLogger
-from typing import Any, Optional
+from typing import AbstractSet, Any, Optional, Union
 
 from pubtools.pulplib import Client, Criteria, Matcher, RpmDependency
 from ubiconfig import UbiConfig
@@ -16,20 +18,29 @@ _LOG = getLogger(__name__)
 
 try:
     from rpm import labelCompare as label_compare  # pylint: disable=no-name-in-module
+
+    # the same evr pairs are compared repeatedly across groups of rpms and
+    # requirements, all comparisons go through the cache, comparisons of
+    # sort keys call it without any python wrapper
+    _label_compare_cached = lru_cache(maxsize=131072)(label_compare)
+    _EVR_CMP_KEY = cmp_to_key(_label_compare_cached)
 except ImportError as ex:  # pragma: no cover
     _LOG.error("Cannot import rpm module, please install rpm python bindings")
 
 
-OPEN_END_ONE_OR_MORE_PAR_REGEX = re.compile(r"^\(+|\)+$")
-OPERATOR_BOOL_REGEX = re.compile(r"if|else|and|or|unless|with|without")
-OPERATOR_NUM_REGEX = re.compile(r"<|<=|=|>|>=")
+# tokens of boolean dependency clause without enclosing parentheses,
+# parenthesized suffix of a name is kept, e.g. pkgA(xxx)
+BOOL_DEP_TOKEN_REGEX = re.compile(r"[^\s()]+(?:\([^\s()]*\))*")
+OPERATORS_BOOL = frozenset(("if", "else", "and", "or", "unless", "with", "without"))
+OPERATORS_NUM = frozenset(("<", "<=", "=", ">", ">="))
 
+# applied to the result of label_compare and 0
 RELATION_CMP_MAP = {
-    "GT": lambda x, y: label_compare(x, y) > 0,
-    "GE": lambda x, y: label_compare(x, y) >= 0,
-    "EQ": lambda x, y: label_compare(x, y) == 0,
-    "LE": lambda x, y: label_compare(x, y) <= 0,
-    "LT": lambda x, y: label_compare(x, y) < 0,
+    "GT": operator.gt,
+    "GE": operator.ge,
+    "EQ": operator.eq,
+    "LE": operator.le,
+    "LT": operator.lt,
 }
 
 
@@ -54,35 +65,37 @@ def create_or_criteria(
     fields: list[str], values: list[tuple[Any, ...]]
 ) -> list[Criteria]:
     """
-    Creates a list of Pulp 'AND' criteria, joining inner criteria for given
-    fields and corresponding values.
+    Creates a list of Pulp criteria to be combined with OR, one criteria
+    matching all given fields for each unique tuple of values.
 
     fields - list of fields [field1, field2]
-    values - list of tuples [(field1 value, field2 value), ...]
+    values - list of hashable tuples [(field1 value, field2 value), ...]
     """
-    or_criteria: list[Criteria] = []
+    values = list(dict.fromkeys(values))
 
-    for val_tuple in values:
-        inner_and_criteria = []
-        if len(val_tuple) != len(fields):
-            raise ValueError
-        for index, field in enumerate(fields):
-            inner_and_criteria.append(Criteria.with_field(field, val_tuple[index]))
+    n_fields = len(fields)
+    if n_fields == 1:
+        # single field doesn't need to be wrapped in 'AND' criteria,
+        # unpacking raises ValueError for tuples of other length
+        field = fields[0]
+        return [Criteria.with_field(field, value) for (value,) in values]
 
-        or_criteria.append(Criteria.and_(*inner_and_criteria))
+    if any(len(val_tuple) != n_fields for val_tuple in values):
+        raise ValueError
 
-    return or_criteria
+    with_field = Criteria.with_field
+    and_ = Criteria.and_
+    return [
+        and_(*[with_field(field, value) for field, value in zip(fields, val_tuple)])
+        for val_tuple in values
+    ]
 
 
 def flatten_list_of_sets(list_of_sets: list[set[Any]]) -> set[Any]:
     """
     Converts a list of sets into a single set.
     """
-    out = set()
-    for one_set in list_of_sets:
-        out |= one_set
-
-    return out
+    return set().union(*list_of_sets)
 
 
 def is_blacklisted(package: UbiUnit, blacklist: list[PackageToExclude]) -> bool:
@@ -103,25 +116,90 @@ def is_blacklisted(package: UbiUnit, blacklist: list[PackageToExclude]) -> bool:
     return False
 
 
+class CompiledBlacklist:
+    """
+    Blacklist compiled for matching packages without iterating over its rules.
+    """
+
+    def __init__(self, blacklist: list[PackageToExclude]) -> None:
+        rules_per_arch: dict[Optional[str], list[PackageToExclude]] = defaultdict(list)
+        # rules without arch (None or empty) are stored under None
+        # and apply to any arch
+        for item in blacklist:
+            rules_per_arch[item.arch or None].append(item)
+
+        # rules of each arch are compiled into a set of exact names and a single
+        # pattern matching prefixes of globbing rules
+        per_arch: dict[Optional[str], tuple[set[str], Optional[re.Pattern[str]]]] = {}
+        for arch, rules in rules_per_arch.items():
+            exact_names = {item.name for item in rules if not item.globbing}
+            prefixes = sorted({re.escape(item.name) for item in rules if item.globbing})
+            prefix_regex = re.compile("|".join(prefixes)) if prefixes else None
+            per_arch[arch] = (exact_names, prefix_regex)
+
+        self._per_arch = per_arch
+
+    @classmethod
+    def of(
+        cls, blacklist: Union[list[PackageToExclude], CompiledBlacklist]
+    ) -> CompiledBlacklist:
+        """
+        Returns given blacklist compiled, already compiled one is returned as is.
+        """
+        if isinstance(blacklist, CompiledBlacklist):
+            return blacklist
+        return cls(blacklist)
+
+    def matches(self, name: str, arch: Optional[str] = None) -> bool:
+        """
+        Determines whether or not package of given name and arch is blacklisted.
+        If arch is not given, rules for any arch are considered.
+        """
+        if arch:
+            arches: tuple[Optional[str], ...] = (None, arch)
+        else:
+            arches = tuple(self._per_arch)
+
+        for rules_arch in arches:
+            compiled = self._per_arch.get(rules_arch)
+            if compiled is None:
+                continue
+            names, prefix_regex = compiled
+            if name in names:
+                return True
+            if prefix_regex is not None and prefix_regex.match(name):
+                return True
+        return False
+
+
 def get_n_latest_from_content(
     content: set[UbiUnit],
-    blacklist: list[PackageToExclude],
-    modular_rpms: Optional[set[str]] = None,
+    blacklist: Union[list[PackageToExclude], CompiledBlacklist],
+    modular_rpms: Optional[AbstractSet[str]] = None,
+    names: Optional[AbstractSet[str]] = None,
 ) -> list[UbiUnit]:
     """
     Filters modular, blacklisted, and outdated RPMs from given content.
+
+    If `names` is given, RPMs with other names are filtered out as well.
     """
-    name_rpms_maps: dict[str, list[UbiUnit]] = {}
+    compiled_blacklist = CompiledBlacklist.of(blacklist)
+    # loop invariant, modular rpms are looked up only if there are any
+    modular_filenames: AbstractSet[str] = modular_rpms or frozenset()
+    check_modular = bool(modular_filenames)
+    name_rpms_maps: dict[str, list[UbiUnit]] = defaultdict(list)
     for item in content:
-        if modular_rpms:
-            if item.filename in modular_rpms:
-                _LOG.debug("Skipping modular RPM %s", item.filename)
-                continue
+        if names is not None and item.name not in names:
+            continue
+
+        if check_modular and item.filename in modular_filenames:
+            _LOG.debug("Skipping modular RPM %s", item.filename)
+            continue
 
-        if is_blacklisted(item, blacklist):
+        if compiled_blacklist.matches(item.name, item.arch):
             continue
 
-        name_rpms_maps.setdefault(item.name, []).append(item)
+        name_rpms_maps[item.name].append(item)
 
     out = []
     for rpm_list in name_rpms_maps.values():
@@ -131,76 +209,48 @@ def get_n_latest_from_content(
     return out
 
 
-def parse_bool_deps(bool_dependency: str) -> set[RpmDependency]:
+@lru_cache(maxsize=65536)
+def parse_bool_deps(bool_dependency: str) -> frozenset[RpmDependency]:
     """
     Parses boolean/rich dependency clause and returns set of names of packages.
+    Results are cached as the same clauses repeat across many RPMs.
     """
-    to_parse = bool_dependency.split()
-
     skip_next = False
-    out = set()
+    names: list[str] = []
 
-    for item in to_parse:
+    for item in BOOL_DEP_TOKEN_REGEX.findall(bool_dependency):
         # skip item immediately apearing after num operator
         if skip_next:
             skip_next = False
             continue
         # skip operator
-        if re.match(OPERATOR_BOOL_REGEX, item):
+        if item in OPERATORS_BOOL:
             continue
-
         # after num operator there is usually evr, we want to skip that as well
-        if re.match(OPERATOR_NUM_REGEX, item):
+        if item in OPERATORS_NUM:
             skip_next = True
             continue
-        # remove all starting and ending paranthesis there can some left when using nesting
-        item = re.sub(OPEN_END_ONE_OR_MORE_PAR_REGEX, "", item)
-        # after all substitutions we ended with empty string, continue to the next item
-        if not item:
-            continue
-        # if there is wanted opening parenthesis in item, let's add ending parenthesis
-        # which we removed in the previous step
-        # in order not to brake the item name
-        if "(" in item:
-            item += ")"
 
-        out.add(RpmDependency(name=item))
-    return out
+        names.append(item)
 
+    # each distinct name is turned into a dependency only once
+    return frozenset(RpmDependency(name=name) for name in set(names))
 
-def vercmp_sort() -> Any:
+
+def evr_key(package: UbiUnit) -> Any:
     """
-    Creates and returns a wrapper class enabling sorting/comparing UbiUnits
-    by epoc, version, release tuple (evr).
+    Returns a key for sorting/comparing UbiUnits by epoch, version,
+    release tuple (evr).
     """
+    return _EVR_CMP_KEY((package.epoch, package.version, package.release))
 
-    class Klass:
-        """
-        Wrapper class for UbiUnits that enables sorting/comparing.
-        """
-
-        def __init__(self, package: UbiUnit):
-            self.evr_tuple = (package.epoch, package.version, package.release)
-
-        def __lt__(self, other: Klass) -> Any:
-            return label_compare(self.evr_tuple, other.evr_tuple) < 0
-
-        def __gt__(self, other: Klass) -> Any:
-            return label_compare(self.evr_tuple, other.evr_tuple) > 0
-
-        def __eq__(self, other: Klass) -> Any:  # type: ignore[override]
-            return label_compare(self.evr_tuple, other.evr_tuple) == 0
 
-        def __le__(self, other: Klass) -> Any:
-            return label_compare(self.evr_tuple, other.evr_tuple) <= 0
-
-        def __ge__(self, other: Klass) -> Any:
-            return label_compare(self.evr_tuple, other.evr_tuple) >= 0
-
-        def __ne__(self, other: Klass) -> Any:  # type: ignore[override]
-            return label_compare(self.evr_tuple, other.evr_tuple) != 0
-
-    return Klass
+def compare_evr(relation: str, evr_1: tuple[Any, ...], evr_2: tuple[Any, ...]) -> bool:
+    """
+    Determines whether or not the first (epoch, version, release) tuple is
+    in given relation (GT, GE, EQ, LE, LT) with the second one.
+    """
+    return bool(RELATION_CMP_MAP[relation](_label_compare_cached(evr_1, evr_2), 0))
 
 
 def is_requirement_resolved(req: RpmDependency, provider: RpmDependency) -> Any:
@@ -211,7 +261,7 @@ def is_requirement_resolved(req: RpmDependency, provider: RpmDependency) -> Any:
         req_evr = (req.epoch, req.version, req.release)
         prov_evr = (provider.epoch, provider.version, provider.release)
         # compare provider with requirement
-        out = RELATION_CMP_MAP[req.flags](prov_evr, req_evr)  # type: ignore [no-untyped-call]
+        out = compare_evr(req.flags, prov_evr, req_evr)
 
     else:
         # without flags we just compare names
@@ -234,12 +284,16 @@ def keep_n_latest_rpms(rpms: list[UbiUnit], n: int = 1) -> None:
     Returns:
         None. The packages list is changed in-place
     """
+    if n == 1:
+        _keep_latest_rpms(rpms)
+        return
+
     # Use a queue of n elements per arch
     pkgs_per_arch: dict[str, Any] = defaultdict(lambda: deque(maxlen=n))
 
     # set of allowed (version, release) tuples
     allowed_ver_rel = set()
-    for rpm in sorted(rpms, key=vercmp_sort(), reverse=True):
+    for rpm in sorted(rpms, key=evr_key, reverse=True):
         allowed_ver_rel.add(
             (
                 rpm.version,
@@ -255,9 +309,37 @@ def keep_n_latest_rpms(rpms: list[UbiUnit], n: int = 1) -> None:
         ) in allowed_ver_rel:
             pkgs_per_arch[rpm.arch].append(rpm)
 
-    latest_pkgs_per_arch = list(chain.from_iterable(pkgs_per_arch.values()))
+    rpms[:] = [rpm for queue in pkgs_per_arch.values() for rpm in queue]
+
+
+def _keep_latest_rpms(rpms: list[UbiUnit]) -> None:
+    """
+    Variant of keep_n_latest_rpms for n == 1 without queues per arch.
+    """
+    if len(rpms) < 2:
+        return
+
+    # only rpms with the latest version and release are kept, so at most
+    # that many rpms plus the first older one are needed in sorted order
+    latest = max(rpms, key=evr_key)
+    latest_count = sum(
+        1
+        for rpm in rpms
+        if rpm.version == latest.version and rpm.release == latest.release
+    )
+
+    latest_per_arch: dict[str, UbiUnit] = {}
+    latest_ver_rel = None
+    for rpm in heapq.nlargest(latest_count + 1, rpms, key=evr_key):
+        ver_rel = (rpm.version, rpm.release)
+        if latest_ver_rel is None:
+            latest_ver_rel = ver_rel
+        elif ver_rel != latest_ver_rel:
+            break
+        # the last one wins, the same as with a queue of one element
+        latest_per_arch[rpm.arch] = rpm
 
-    rpms[:] = latest_pkgs_per_arch
+    rpms[:] = latest_per_arch.values()
 
 
 # borrowed from https://github.com/rpm-software-management/yum
@@ -272,23 +354,11 @@ def split_filename(filename: str) -> tuple[str, ...]:
     if filename[-4:] == ".rpm":
         filename = filename[:-4]
 
-    arch_index = filename.rfind(".")
-    arch = filename[arch_index + 1 :]
-
-    rel_index = filename[:arch_index].rfind("-")
-    rel = filename[rel_index + 1 : arch_index]
-
-    ver_index = filename[:rel_index].rfind("-")
-    ver = filename[ver_index + 1 : rel_index]
-
-    epoch_index = filename.find(":")
-
-    if epoch_index == -1:
-        epoch = ""
-    else:
-        epoch = filename[:epoch_index]
-
-    name = filename[epoch_index + 1 : ver_index]
+    # split from the right, each part is found with one scan of the remainder
+    rest, _, arch = filename.rpartition(".")
+    rest, _, rel = rest.rpartition("-")
+    rest, _, ver = rest.rpartition("-")
+    epoch, _, name = rest.rpartition(":")
 
     return name, ver, rel, epoch, arch
 
@@ -301,12 +371,11 @@ def remap_keys(
 
     E.g., mapping["A", "1"], dict_to_remap["A", list[...]] == output["1", list[...]]
     """
-    out: dict[str, list[UbiUnit]] = {}
+    out: dict[str, list[UbiUnit]] = defaultdict(list)
     for k, v in dict_to_remap.items():
-        new_key = mapping[k]
-        out.setdefault(new_key, []).extend(v)
+        out[mapping[k]].extend(v)
 
-    return out
+    return dict(out)
 
 
 def parse_blacklist_config(ubi_config: UbiConfig) -> list[PackageToExclude]:
@@ -331,14 +400,8 @@ def keep_n_latest_modules(modules: list[UbiUnit], n: int = 1) -> None:
     """
     Keeps n latest modules in modules sorted list.
     """
-    modules_to_keep = []
-    versions_to_keep = sorted(set(m.version for m in modules))[-n:]
-
-    for module in modules:
-        if module.version in versions_to_keep:
-            modules_to_keep.append(module)
-
-    modules[:] = modules_to_keep
+    versions_to_keep = set(heapq.nlargest(n, {m.version for m in modules}))
+    modules[:] = [m for m in modules if m.version in versions_to_keep]
 
 
 def get_modulemd_output_set(modules: set[UbiUnit]) -> list[UbiUnit]:
@@ -346,12 +409,12 @@ def get_modulemd_output_set(modules: set[UbiUnit]) -> list[UbiUnit]:
     Take all modular packages and for each package and stream return only the
     latest version of it.
     """
-    name_stream_modules_map: dict[str, list[UbiUnit]] = {}
+    name_stream_modules_map: dict[tuple[str, str], list[UbiUnit]] = defaultdict(list)
     # create internal dict structure for easier sorting
-    # mapping "name + stream": list of modules
+    # mapping (name, stream): list of modules
     for modulemd in modules:
-        key = modulemd.name + modulemd.stream
-        name_stream_modules_map.setdefault(key, []).append(modulemd)
+        key = (modulemd.name, modulemd.stream)
+        name_stream_modules_map[key].append(modulemd)
 
     out = []
     # sort rpms and keep N latest versions of them
@@ -368,23 +431,14 @@ def get_criteria_for_modules(modules: list[UbiUnit]) -> list[Criteria]:
     Creates OR criteria that search for all modules by name and stream. If the
     module has empty stream field, all modules with the corresponding name will be matched.
     """
-    criteria_values = []
-    for module in modules:
-        if module.stream:
-            criteria_values.append(
-                (
-                    module.name,
-                    module.stream,
-                )
-            )
-        else:
-            criteria_values.append(
-                (
-                    module.name,
-                    Matcher.exists(),
-                )
-            )
-
-    fields = ["name", "stream"]
-    or_criteria = create_or_criteria(fields, criteria_values)
-    return or_criteria
+    # fields are fixed, so criteria are built directly for unique name/stream pairs
+    with_field = Criteria.with_field
+    return [
+        Criteria.and_(
+            with_field("name", name),
+            with_field("stream", stream if stream else Matcher.exists()),
+        )
+        for name, stream in dict.fromkeys(
+            (module.name, module.stream) for module in modules
+        )
+    ]